@@ -1,29 +1,233 @@
 # mcp-client/mcp_client.py
 
 import asyncio
+import hashlib
 import json
-import subprocess
+import math
+import os
+import re
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from itertools import islice
 from typing import Optional, Dict, Any, List
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 import ollama
+import orjson
 from dataclasses import dataclass
 
 
-@dataclass
+# Keep the model (and its KV cache for the system prompt prefix) resident
+# between turns. num_ctx must stay constant: changing it reloads the model.
+OLLAMA_KEEP_ALIVE = "1h"
+OLLAMA_OPTIONS = {"num_ctx": 8192}
+
+# The dispatch model only has to emit TOOL_CALL lines, so its output is short
+# and deterministic
+DISPATCH_OPTIONS = {**OLLAMA_OPTIONS, "num_predict": 64, "temperature": 0}
+
+# A tool call that has failed on this many consecutive turns is treated as an
+# error loop: the turn is aborted and the conversation reset
+MAX_FAILED_TOOL_CALL_REPEATS = 3
+
+# Response cache sizing. Semantic matches only reuse dispatch decisions
+# (TOOL_CALL responses) for tools whose schema has no parameters: the tool
+# still runs, so results are never stale.
+RESPONSE_CACHE_SIZE = 256
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+
+def _cache_key(*parts: str) -> str:
+    """Hash the parts that determine an LLM response into a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+TOOL_CALL_MARKER = "TOOL_CALL:"
+# Same name pattern as the web client, so hyphenated tool names parse whole
+_TOOL_CALL_RE = re.compile(r"TOOL_CALL:\s*([^\s{]+)[ \t]*")
+
+# Streamed output is held back until this many characters have arrived, so a
+# response that opens with a tool call is never shown to the user
+TOOL_CALL_LOOKAHEAD = 64
+
+
+def _is_tool_error(result: str) -> bool:
+    return result.startswith("Error calling tool")
+
+
+def _withheld_text(response: str) -> str:
+    """The part of a response the CLI did not print: everything from the first TOOL_CALL marker on"""
+    marker = response.find(TOOL_CALL_MARKER)
+    return response[marker:] if marker != -1 else ""
+
+
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+
+
+def _find_json_end(text: str, start: int) -> int:
+    """Index just past the balanced JSON object opening at text[start], or -1 if unterminated"""
+    depth = 0
+    in_string = False
+    escaped_until = start
+    # Jump between structural characters instead of visiting every one
+    for token in _JSON_TOKEN_RE.finditer(text, start):
+        pos = token.start()
+        if pos < escaped_until:
+            continue
+        ch = token.group()
+        if in_string:
+            if ch == "\\":
+                escaped_until = pos + 2
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+    return -1
+
+
+SYSTEM_PROMPT_TEMPLATE = """You are a helpful cloud compliance assistant. You have access to tools that can check AWS cloud compliance and list resources.
+
+{tools_info}
+
+When a user asks a question that requires using a tool, respond with:
+TOOL_CALL: tool_name {{"param1": "value1", "param2": "value2"}}
+
+For example:
+- If asked to list S3 buckets: TOOL_CALL: list_s3_buckets {{}}
+- If asked to check compliance: TOOL_CALL: check_resource_compliance {{"resourceType": "storage", "standard": "SOC2"}}
+
+If a question needs more than one tool, put each TOOL_CALL on its own line; they run together. For example:
+TOOL_CALL: list_s3_buckets {{}}
+TOOL_CALL: check_resource_compliance {{"resourceType": "storage", "standard": "SOC2"}}
+
+After receiving tool results, provide a helpful natural language explanation to the user."""
+
+
+@asynccontextmanager
+async def _http_transport(url: str):
+    """Adapt the streamable HTTP client to the (read, write) pair stdio_client yields"""
+    # Imported here so the stdio path works even if this transport is unavailable
+    from mcp.client.streamable_http import streamablehttp_client
+    
+    async with streamablehttp_client(url) as (read, write, _):
+        yield read, write
+
+
+# Limits applied to tool output before it is sent back to the model
+MAX_TOOL_RESULT_CHARS = 8000
+MAX_TOOL_RESULT_ITEMS = 20
+MAX_TOOL_RESULT_STRING = 500
+
+
+def _trim_tool_result(result: str) -> str:
+    if len(result) <= MAX_TOOL_RESULT_CHARS:
+        return result
+    return f"{result[:MAX_TOOL_RESULT_CHARS]}\n... ({len(result) - MAX_TOOL_RESULT_CHARS} more characters truncated)"
+
+
+def _project(value: Any) -> Any:
+    """Drop null and empty-string fields, cap list lengths and shorten long strings"""
+    if isinstance(value, dict):
+        # Empty lists and objects stay: an empty "violations" means none were found
+        return {key: _project(item) for key, item in value.items() if item is not None and item != ""}
+    if isinstance(value, list):
+        items = [_project(item) for item in value[:MAX_TOOL_RESULT_ITEMS]]
+        if len(value) > MAX_TOOL_RESULT_ITEMS:
+            items.append(f"... ({len(value) - MAX_TOOL_RESULT_ITEMS} more)")
+        return items
+    if isinstance(value, str) and len(value) > MAX_TOOL_RESULT_STRING:
+        return value[:MAX_TOOL_RESULT_STRING] + "..."
+    return value
+
+
+def _project_tool_result(result: str) -> str:
+    """Shrink a tool result so the explanation call prefills fewer tokens"""
+    try:
+        data = orjson.loads(result)
+    except orjson.JSONDecodeError:
+        return _trim_tool_result(result)
+    return _trim_tool_result(orjson.dumps(_project(data)).decode())
+
+
+# Intent shortcut: a query whose words are almost all covered by a single
+# parameter-free tool's name/description is dispatched without the LLM
+INTENT_MATCH_THRESHOLD = 0.75
+INTENT_MATCH_MARGIN = 0.25
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({
+    "a", "an", "the", "my", "me", "i", "you", "your", "our", "we", "is", "are",
+    "do", "does", "can", "could", "please", "what", "which", "show", "all",
+    "of", "in", "for", "to", "this", "that", "with", "by", "and", "or", "it",
+})
+
+
+def _keywords(text: str) -> set:
+    """Lowercase content words with a crude plural/verb 's' stripped"""
+    return {
+        word.rstrip("s") if len(word) > 3 else word
+        for word in _WORD_RE.findall(text.lower())
+        if word not in _STOPWORDS
+    }
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass(slots=True, frozen=True)
 class Message:
     role: str
     content: str
 
 
 class CloudComplianceClient:
-    def __init__(self, model_name: str = "llama3.2:3b"):
+    def __init__(self, model_name: str = "llama3.2:3b", max_history_turns: int = 8,
+                 embedding_model: Optional[str] = "nomic-embed-text",
+                 dispatch_model: Optional[str] = None):
         self.model_name = model_name
-        self.conversation_history: List[Message] = []
+        # Optional smaller model (e.g. "llama3.2:1b-instruct-q4_K_M") that
+        # decides on tool calls; model_name still writes every answer
+        self.dispatch_model = dispatch_model
+        self.max_history_turns = max_history_turns
+        self.embedding_model = embedding_model
+        # Room for one turn past the window so compact_history can summarize
+        # it; the deque's maxlen is only a backstop
+        self.conversation_history: deque = deque(maxlen=2 * max_history_turns + 2)
         self.available_tools: List[Dict] = []
+        self._response_cache: OrderedDict[str, str] = OrderedDict()
+        self._dispatch_cache: deque = deque(maxlen=RESPONSE_CACHE_SIZE)
+        self._tools_prompt_cache: Optional[tuple[Any, str]] = None
+        # One client for the whole session keeps its HTTP connection alive
+        self._ollama = ollama.AsyncClient(
+            host=os.environ.get("OLLAMA_HOST", "http://localhost:11434"),
+            timeout=600
+        )
+        self._models: Optional[List[str]] = None
+        self._intent_index: List[tuple[str, set, bool]] = []
+        self._parameterless_tools: set = set()
+        # Consecutive turns on which each (tool, arguments) call has failed
+        self._failed_calls: Counter = Counter()
         
     async def connect_to_mcp_server(self):
         """Connect to the MCP server running in Docker"""
+        # A long-lived server (the HTTP wrapper started by docker-compose)
+        # avoids forking `docker exec` and piping every message through it
+        server_url = os.environ.get("MCP_SERVER_URL")
+        if server_url:
+            return _http_transport(server_url)
+        
         server_params = StdioServerParameters(
             command="docker",
             args=[
@@ -37,24 +241,67 @@ class CloudComplianceClient:
     
     def format_tools_for_llm(self, tools) -> str:
         """Format MCP tools into a prompt for the LLM"""
-        tools_description = "Available tools:\n\n"
+        # The tool list is fixed after list_tools(), so build the text once
+        if self._tools_prompt_cache and self._tools_prompt_cache[0] is tools:
+            return self._tools_prompt_cache[1]
+        
+        lines = ["Available tools:", ""]
         
         for tool in tools:
-            tools_description += f"- **{tool.name}**: {tool.description}\n"
+            lines.append(f"- **{tool.name}**: {tool.description}")
             if hasattr(tool, 'inputSchema') and tool.inputSchema:
                 schema = tool.inputSchema
                 if 'properties' in schema:
-                    tools_description += "  Parameters:\n"
-                    for param_name, param_info in schema['properties'].items():
+                    lines.append("  Parameters:")
+                    required_params = set(schema.get('required', []))
+                    # Sorted so the prompt is byte-identical across runs
+                    for param_name, param_info in sorted(schema['properties'].items()):
                         param_type = param_info.get('type', 'string')
                         param_desc = param_info.get('description', '')
-                        required = param_name in schema.get('required', [])
-                        req_marker = " (required)" if required else " (optional)"
-                        tools_description += f"    - {param_name} ({param_type}){req_marker}: {param_desc}\n"
-            tools_description += "\n"
+                        req_marker = " (required)" if param_name in required_params else " (optional)"
+                        lines.append(f"    - {param_name} ({param_type}){req_marker}: {param_desc}")
+            lines.append("")
         
+        # Trailing whitespace would make otherwise identical prompts differ
+        tools_description = "\n".join(line.rstrip() for line in lines) + "\n"
+        self._tools_prompt_cache = (tools, tools_description)
         return tools_description
     
+    def build_system_prompt(self) -> str:
+        """Build the system prompt once per session so every call shares the same prefix"""
+        return SYSTEM_PROMPT_TEMPLATE.format(
+            tools_info=self.format_tools_for_llm(self.available_tools)
+        )
+    
+    def build_intent_index(self):
+        """Precompute the trigger keywords for each tool, and which tools take no parameters"""
+        self._intent_index = []
+        self._parameterless_tools = set()
+        for tool in self.available_tools:
+            schema = getattr(tool, 'inputSchema', None) or {}
+            if not schema.get('properties'):
+                self._parameterless_tools.add(tool.name)
+            has_required = bool(schema.get('required'))
+            keywords = _keywords(tool.name.replace("_", " ")) | _keywords(tool.description or "")
+            self._intent_index.append((tool.name, keywords, has_required))
+    
+    def match_intent(self, user_input: str) -> Optional[str]:
+        """Return a parameter-free tool that clearly matches the query, if any"""
+        words = _keywords(user_input)
+        if not words or not self._intent_index:
+            return None
+        
+        scores = sorted(
+            ((len(words & keywords) / len(words), tool_name, has_required)
+             for tool_name, keywords, has_required in self._intent_index),
+            reverse=True
+        )
+        best_score, tool_name, has_required = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        if has_required or best_score < INTENT_MATCH_THRESHOLD or best_score - runner_up < INTENT_MATCH_MARGIN:
+            return None
+        return tool_name
+    
     async def call_mcp_tool(self, session: ClientSession, tool_name: str, arguments: Dict[str, Any]) -> str:
         """Call an MCP tool and return the result"""
         try:
@@ -63,40 +310,227 @@ class CloudComplianceClient:
             # Extract content from result
             if hasattr(result, 'content') and result.content:
                 if isinstance(result.content, list) and len(result.content) > 0:
-                    return result.content[0].text
-                return str(result.content)
-            return str(result)
+                    text = result.content[0].text
+                else:
+                    text = str(result.content)
+            else:
+                text = str(result)
+            # Errors reported by the tool itself are marked like transport errors
+            if getattr(result, 'isError', False):
+                return f"Error calling tool {tool_name}: {text}"
+            return text
         except Exception as e:
             return f"Error calling tool {tool_name}: {str(e)}"
     
-    def parse_tool_call(self, llm_response: str) -> Optional[tuple[str, Dict[str, Any]]]:
-        """Parse tool call from LLM response if present"""
+    def parse_tool_calls(self, llm_response: str) -> List[tuple[str, Dict[str, Any]]]:
+        """Parse every tool call from the LLM response"""
         # Look for tool call patterns like:
         # TOOL_CALL: tool_name {"param": "value"}
-        # Or JSON format tool calls
+        # The LLM may emit several of these, one per line
+        tool_calls = []
         
-        if "TOOL_CALL:" in llm_response:
-            parts = llm_response.split("TOOL_CALL:", 1)[1].strip()
-            lines = parts.split("\n", 1)
-            tool_line = lines[0].strip()
+        for match in _TOOL_CALL_RE.finditer(llm_response):
+            tool_name = match.group(1)
+            start = match.end()
             
-            # Parse tool name and arguments
-            if "{" in tool_line:
-                tool_name = tool_line.split("{")[0].strip()
-                json_str = "{" + tool_line.split("{", 1)[1]
-                try:
-                    arguments = json.loads(json_str)
-                    return (tool_name, arguments)
-                except json.JSONDecodeError:
-                    pass
-            else:
+            if not llm_response.startswith("{", start):
                 # Tool call without arguments
-                return (tool_line, {})
+                tool_calls.append((tool_name, {}))
+                continue
+            
+            # Take exactly the balanced object, ignoring any trailing prose
+            end = _find_json_end(llm_response, start)
+            if end == -1:
+                continue
+            try:
+                arguments = orjson.loads(llm_response[start:end])
+            except orjson.JSONDecodeError:
+                continue
+            if isinstance(arguments, dict):
+                tool_calls.append((tool_name, arguments))
         
-        return None
+        return tool_calls
     
-    def call_llm(self, user_message: str, system_prompt: str = "") -> str:
+    async def list_models(self) -> List[str]:
+        """Return the names of the models Ollama has pulled, fetched once per session"""
+        if self._models is None:
+            response = await self._ollama.list()
+            self._models = [model.get('model') or model.get('name') for model in response['models']]
+        return self._models
+    
+    async def warm_up_model(self):
+        """Load the models into memory so the first turn doesn't pay for it"""
+        models = {self.model_name, self.dispatch_model} - {None}
+        # A failed warm-up just means the first call loads the model
+        await asyncio.gather(*(
+            self._ollama.generate(
+                model=model,
+                prompt="ok",
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                options={**OLLAMA_OPTIONS, "num_predict": 1}
+            )
+            for model in models
+        ), return_exceptions=True)
+    
+    async def prime_prompt_cache(self, system_prompt: str):
+        """Evaluate the system prompt once so Ollama caches its KV state"""
+        try:
+            await self._ollama.chat(
+                model=self.model_name,
+                messages=[{"role": "system", "content": system_prompt}],
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                options={**OLLAMA_OPTIONS, "num_predict": 1}
+            )
+        except Exception:
+            # Priming is only an optimization; the first real call will prefill
+            pass
+    
+    async def _summarize(self, messages: List[Message]) -> str:
+        """Summarize older conversation turns with a one-shot generation"""
+        transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+        response = await self._ollama.generate(
+            model=self.model_name,
+            prompt=f"Summarize this conversation in a few sentences, keeping any facts about the user's cloud resources and compliance results:\n\n{transcript}",
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            options=OLLAMA_OPTIONS
+        )
+        return response['response'].strip()
+    
+    async def compact_history(self):
+        """Fold older turns into a summary once the history window is full"""
+        if len(self.conversation_history) <= 2 * self.max_history_turns:
+            return
+        
+        # Keep the most recent half of the window verbatim
+        history = list(self.conversation_history)
+        keep = self.max_history_turns
+        older, recent = history[:-keep], history[-keep:]
+        self.conversation_history.clear()
+        try:
+            summary = await self._summarize(older)
+            self.conversation_history.append(Message("system", f"Summary: {summary}"))
+        except Exception:
+            # Fall back to a plain sliding window
+            pass
+        self.conversation_history.extend(recent)
+    
+    async def _chat(self, messages: List[Dict[str, str]], stream: bool, model: str,
+                    options: Dict[str, Any]) -> str:
+        """Run an Ollama chat call, printing tokens as they arrive when streaming"""
+        response = await self._ollama.chat(
+            model=model,
+            messages=messages,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            options=options,
+            stream=stream
+        )
+        if not stream:
+            return response['message']['content']
+        
+        # Print text as it arrives but stop at a TOOL_CALL marker; the tail of
+        # `pending` is held back in case it is the start of a marker. Exactly
+        # _withheld_text(response) is left unprinted
+        parts = []
+        pending = ""
+        received = 0
+        shown = False
+        tool_call_seen = False
+        async for chunk in response:
+            content = chunk['message']['content']
+            parts.append(content)
+            received += len(content)
+            if tool_call_seen:
+                continue
+            
+            pending += content
+            marker = pending.find(TOOL_CALL_MARKER)
+            if marker != -1:
+                pending, tool_call_seen = pending[:marker], True
+            elif received < TOOL_CALL_LOOKAHEAD:
+                continue
+            
+            flush_to = len(pending) if tool_call_seen else len(pending) - len(TOOL_CALL_MARKER) + 1
+            if flush_to > 0:
+                print(pending[:flush_to], end="", flush=True)
+                pending = pending[flush_to:]
+                shown = True
+        
+        if pending and not tool_call_seen:
+            print(pending, end="")
+            shown = True
+        if shown:
+            print()
+        return "".join(parts)
+    
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """Embed text for semantic cache lookups, if an embedding model is available"""
+        if not self.embedding_model:
+            return None
+        try:
+            response = await self._ollama.embeddings(model=self.embedding_model, prompt=text)
+            return response['embedding']
+        except Exception:
+            # Model not pulled or unsupported; disable the semantic layer
+            self.embedding_model = None
+            return None
+    
+    async def dispatch(self, user_input: str, system_prompt: str) -> str:
+        """Get the LLM's first response, reusing a similar past tool dispatch if any"""
+        tool_name = self.match_intent(user_input)
+        if tool_name:
+            return f"{TOOL_CALL_MARKER} {tool_name} {{}}"
+        
+        embedding = await self.embed(user_input)
+        if embedding:
+            best = max(self._dispatch_cache, key=lambda entry: _cosine(embedding, entry[0]), default=None)
+            if best and _cosine(embedding, best[0]) >= SEMANTIC_CACHE_THRESHOLD:
+                return best[1]
+        
+        llm_response = None
+        if self.dispatch_model:
+            decision = await self.call_llm(
+                user_input, system_prompt, model=self.dispatch_model, options=DISPATCH_OPTIONS
+            )
+            # A malformed call from the small model falls through to the main one
+            if self.parse_tool_calls(decision):
+                llm_response = decision
+        if llm_response is None:
+            # No tool needed (or no dispatch model): the main model answers directly
+            llm_response = await self.call_llm(user_input, system_prompt, stream=True)
+        
+        # Only calls to tools that accept no parameters at all are safe to
+        # replay: similar questions ("SOC2 vs HIPAA compliance for storage",
+        # "my buckets" vs "my buckets in eu-west-1") embed close together but
+        # need different arguments, even optional ones
+        if embedding and TOOL_CALL_MARKER in llm_response:
+            tool_calls = self.parse_tool_calls(llm_response)
+            if tool_calls and all(tool_name in self._parameterless_tools for tool_name, _ in tool_calls):
+                self._dispatch_cache.append((embedding, llm_response))
+        return llm_response
+    
+    async def call_llm(self, user_message: str, system_prompt: str = "", stream: bool = False,
+                       cache_key: Optional[str] = None,
+                       continuation: Optional[List[Dict[str, str]]] = None,
+                       model: Optional[str] = None,
+                       options: Optional[Dict[str, Any]] = None) -> str:
         """Call Ollama LLM with the conversation history"""
+        model = model or self.model_name
+        options = options or OLLAMA_OPTIONS
+        if cache_key is None:
+            tail_start = max(len(self.conversation_history) - 2, 0)
+            history_tail = "".join(
+                f"{msg.role}:{msg.content}" for msg in islice(self.conversation_history, tail_start, None)
+            )
+            cache_key = _cache_key(model, system_prompt, history_tail, user_message)
+        
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            visible = cached.split(TOOL_CALL_MARKER, 1)[0]
+            if stream and visible:
+                print(visible)
+            return cached
+        
         messages = []
         
         # Add system prompt if provided
@@ -104,27 +538,37 @@ class CloudComplianceClient:
             messages.append({"role": "system", "content": system_prompt})
         
         # Add conversation history
-        for msg in self.conversation_history:
-            messages.append({"role": msg.role, "content": msg.content})
+        messages.extend({"role": msg.role, "content": msg.content} for msg in self.conversation_history)
         
         # Add current user message
         messages.append({"role": "user", "content": user_message})
         
-        # Call Ollama
+        # Extending the previous call's messages lets Ollama reuse its KV cache
+        if continuation:
+            messages.extend(continuation)
+        
+        # Async client keeps the event loop (and MCP session) responsive
         try:
-            response = ollama.chat(
-                model=self.model_name,
-                messages=messages
-            )
-            return response['message']['content']
+            response = await self._chat(messages, stream, model, options)
         except Exception as e:
-            return f"Error calling LLM: {str(e)}"
+            error = f"Error calling LLM: {str(e)}"
+            if stream:
+                print(error)
+            return error
+        
+        self._response_cache[cache_key] = response
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+        return response
     
     async def chat_loop(self):
         """Main conversation loop"""
         print("🚀 Cloud Compliance Assistant Starting...")
         print("Connecting to MCP server...\n")
         
+        # Load the model while the MCP server starts up, not on the first turn
+        warm_up = asyncio.create_task(self.warm_up_model())
+        
         async with await self.connect_to_mcp_server() as (read, write):
             async with ClientSession(read, write) as session:
                 # Initialize MCP session
@@ -147,20 +591,13 @@ class CloudComplianceClient:
                 print("Type 'exit' or 'quit' to end the conversation.")
                 print("="*60 + "\n")
                 
-                # Create system prompt with tool information
-                tools_info = self.format_tools_for_llm(self.available_tools)
-                system_prompt = f"""You are a helpful cloud compliance assistant. You have access to tools that can check AWS cloud compliance and list resources.
-
-{tools_info}
-
-When a user asks a question that requires using a tool, respond with:
-TOOL_CALL: tool_name {{"param1": "value1", "param2": "value2"}}
-
-For example:
-- If asked to list S3 buckets: TOOL_CALL: list_s3_buckets {{}}
-- If asked to check compliance: TOOL_CALL: check_resource_compliance {{"resourceType": "storage", "standard": "SOC2"}}
-
-After receiving tool results, provide a helpful natural language explanation to the user."""
+                system_prompt = self.build_system_prompt()
+                self.build_intent_index()
+                
+                # The system prompt never changes during the session, so every
+                # call shares this prefix and Ollama can reuse its KV cache
+                await warm_up
+                await self.prime_prompt_cache(system_prompt)
                 
                 # Conversation loop
                 while True:
@@ -176,33 +613,74 @@ After receiving tool results, provide a helpful natural language explanation to
                         
                         # Get LLM response
                         print("\n🤖 Assistant: ", end="", flush=True)
-                        llm_response = self.call_llm(user_input, system_prompt)
+                        llm_response = await self.dispatch(user_input, system_prompt)
                         
-                        # Check if LLM wants to call a tool
-                        tool_call = self.parse_tool_call(llm_response)
+                        # Check if LLM wants to call tools
+                        tool_calls = self.parse_tool_calls(llm_response)
                         
-                        if tool_call:
-                            tool_name, arguments = tool_call
-                            print(f"[Calling tool: {tool_name}...]")
+                        # Identical calls are coalesced into a single MCP round-trip
+                        unique_calls = dict(
+                            ((tool_name, json.dumps(arguments, sort_keys=True)), (tool_name, arguments))
+                            for tool_name, arguments in tool_calls
+                        )
+                        call_keys, tool_calls = list(unique_calls), list(unique_calls.values())
+                        
+                        # Retrying a call that keeps failing only grows the context
+                        if any(self._failed_calls[key] >= MAX_FAILED_TOOL_CALL_REPEATS - 1 for key in call_keys):
+                            print("[The same tool call keeps failing; starting the conversation over. Please rephrase your question.]")
+                            self.conversation_history.clear()
+                            self._failed_calls.clear()
+                            continue
+                        
+                        if tool_calls:
+                            for tool_name, _ in tool_calls:
+                                print(f"[Calling tool: {tool_name}...]")
                             
-                            # Call the tool
-                            tool_result = await self.call_mcp_tool(session, tool_name, arguments)
+                            # Independent tool calls share the session, so overlap them
+                            tool_results = await asyncio.gather(*(
+                                self.call_mcp_tool(session, tool_name, arguments)
+                                for tool_name, arguments in tool_calls
+                            ))
+                            # Only consecutive failures count, so a success resets a call
+                            self._failed_calls = Counter({
+                                key: self._failed_calls[key] + 1
+                                for key, tool_result in zip(call_keys, tool_results)
+                                if _is_tool_error(tool_result)
+                            })
                             
-                            # Send tool result back to LLM for natural language response
-                            follow_up_prompt = f"The tool '{tool_name}' returned:\n{tool_result}\n\nPlease explain these results to the user in a helpful way."
-                            final_response = self.call_llm(follow_up_prompt, system_prompt)
-                            print(final_response)
+                            # Continue the same conversation with the tool results so the
+                            # explanation only prefills the new tool messages
+                            continuation = [{"role": "assistant", "content": llm_response}]
+                            continuation.extend(
+                                {"role": "tool", "content": f"The tool '{tool_name}' returned:\n{_project_tool_result(tool_result)}"}
+                                for (tool_name, _), tool_result in zip(tool_calls, tool_results)
+                            )
+                            # Identical tool results need no new explanation
+                            explain_key = _cache_key(self.model_name, user_input, *(
+                                f"{tool_name}{json.dumps(arguments, sort_keys=True)}{tool_result}"
+                                for (tool_name, arguments), tool_result in zip(tool_calls, tool_results)
+                            ))
+                            final_response = await self.call_llm(
+                                user_input, system_prompt, stream=True,
+                                cache_key=explain_key, continuation=continuation
+                            )
                             
                             # Save to history
                             self.conversation_history.append(Message("user", user_input))
                             self.conversation_history.append(Message("assistant", final_response))
                         else:
-                            # Direct response without tool call
-                            print(llm_response)
-                            
+                            # Direct response without tool call, already streamed up to any
+                            # TOOL_CALL marker; show what was held back if it didn't parse
+                            withheld = _withheld_text(llm_response)
+                            if withheld:
+                                print("[Could not parse the tool call in this response:]")
+                                print(withheld)
                             # Save to history
                             self.conversation_history.append(Message("user", user_input))
                             self.conversation_history.append(Message("assistant", llm_response))
+                        
+                        # Keep the prompt size bounded as the session grows
+                        await self.compact_history()
                     
                     except KeyboardInterrupt:
                         print("\n\n👋 Goodbye!")
@@ -211,31 +689,60 @@ After receiving tool results, provide a helpful natural language explanation to
                         print(f"\n❌ Error: {str(e)}")
 
 
-async def main():
-    # Check if Ollama is running
+def _has_model(models: List[str], name: str) -> bool:
+    return name in models or f"{name}:latest" in models
+
+
+async def _check_ollama(client: CloudComplianceClient) -> bool:
     try:
-        ollama.list()
+        models = await client.list_models()
     except Exception:
         print("❌ Error: Ollama is not running. Please start Ollama first:")
         print("   ollama serve")
-        return
+        return False
+    
+    if not _has_model(models, client.model_name):
+        print(f"⚠️  Model {client.model_name} is not pulled yet. Run:")
+        print(f"   ollama pull {client.model_name}")
+    if client.embedding_model and not _has_model(models, client.embedding_model):
+        # Skip the semantic cache instead of failing an embedding call per turn
+        client.embedding_model = None
+    return True
+
+
+async def _check_docker() -> bool:
+    # Not needed when talking to a remote server
+    if os.environ.get("MCP_SERVER_URL"):
+        return True
     
-    # Check if Docker container is running
     try:
-        result = subprocess.run(
-            ["docker", "ps", "--filter", "name=cloud-compliance-mcp", "--format", "{{.Names}}"],
-            capture_output=True,
-            text=True
+        proc = await asyncio.create_subprocess_exec(
+            "docker", "ps", "--filter", "name=cloud-compliance-mcp", "--format", "{{.Names}}",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
         )
-        if "cloud-compliance-mcp" not in result.stdout:
+        stdout, _ = await proc.communicate()
+        if b"cloud-compliance-mcp" not in stdout:
             print("❌ Error: MCP server container is not running. Please start it:")
             print("   docker-compose up -d")
-            return
+            return False
+        return True
     except Exception as e:
         print(f"❌ Error checking Docker: {e}")
+        return False
+
+
+async def main():
+    client = CloudComplianceClient(
+        model_name="llama3.2:3b",
+        dispatch_model=os.environ.get("OLLAMA_DISPATCH_MODEL")
+    )
+    
+    # Check that Ollama and the MCP server container are running
+    ollama_ok, docker_ok = await asyncio.gather(_check_ollama(client), _check_docker())
+    if not (ollama_ok and docker_ok):
         return
     
-    client = CloudComplianceClient(model_name="llama3.2:3b")
     await client.chat_loop()
 
 